@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -44,6 +45,7 @@ MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'catalog.admission.AdmissionControlMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
@@ -82,6 +84,59 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Общий для всех воркеров кеш задаётся адресом Redis в DJANGO_CACHE_URL,
+# например redis://127.0.0.1:6379/1. Без него кеш живёт в памяти процесса:
+# сессии хранятся только в БД, а пользователи не кешируются.
+
+CACHE_URL = os.environ.get('DJANGO_CACHE_URL')
+
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        },
+        'admission': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+            'KEY_PREFIX': 'admission',
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+        'admission': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'admission',
+        },
+    }
+
+
+# Sessions and authentication
+
+# Сессии в кеше безопасны только при общем кеше: иначе выход из системы
+# сбросил бы сессию лишь в одном воркере
+SESSION_ENGINE = 'catalog.sessions' if CACHE_URL else 'django.contrib.sessions.backends.db'
+
+AUTHENTICATION_BACKENDS = [
+    'catalog.backends.CachedModelBackend',
+]
+AUTH_USER_CACHE_TIMEOUT = 60  # секунд
+
+
+# Контроль нагрузки на дорогие точки входа (catalog.admission), состояние
+# в кеше 'admission': rate — (запросов, за секунд) на клиента,
+# concurrency — одновременно на класс
+ADMISSION_CONTROL = {
+    'password': {'rate': (5, 60), 'concurrency': 4},
+    'upload': {'rate': (10, 60), 'concurrency': 4},
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -122,6 +177,30 @@ STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Загруженные изображения хранятся один раз под хешем содержимого
+# (catalog.storage.ContentAddressedStorage, каталог MEDIA_URL + 'blobs/').
+# Содержимое по такому URL никогда не меняется, поэтому веб-сервер, который
+# раздаёт медиа в продакшене, должен отдавать для MEDIA_URL + 'blobs/'
+# заголовок "Cache-Control: public, max-age=31536000, immutable".
+# Например, для nginx:
+#     location /media/blobs/ {
+#         add_header Cache-Control "public, max-age=31536000, immutable";
+#     }
+# При DEBUG этот заголовок ставит Design_pro2/urls.py.
+STORAGES = {
+    'default': {
+        'BACKEND': 'catalog.storage.ContentAddressedStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
+# Загрузка изображений заявок (catalog.uploads.image_uploads):
+# ограничения проверяются по мере приёма файла
+IMAGE_UPLOAD_MAX_SIZE = 2 * 1024 * 1024
+IMAGE_UPLOAD_MAX_DIMENSION = 10000
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
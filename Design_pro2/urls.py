@@ -15,20 +15,37 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path
+from django.contrib.auth import views as auth_views
+from django.urls import path, re_path
 from django.urls import include
+from django.views.decorators.cache import cache_control
+from django.views.static import serve
 from django.views.generic import RedirectView
 from django.conf import settings
 from django.conf.urls.static import static
+from django.core.files.storage import default_storage
+from catalog.admission import admission_control
 
 urlpatterns = [
     path('admin/', admin.site.urls),
 
 ]
 
+# Блобы адресуются по содержимому и не меняются — кешируем их навсегда
+if settings.DEBUG:
+    urlpatterns += [
+        re_path(
+            r'^%s(?P<path>%s/.*)$' % (settings.MEDIA_URL.lstrip('/'), default_storage.prefix),
+            cache_control(max_age=31536000, immutable=True, public=True)(serve),
+            {'document_root': settings.MEDIA_ROOT},
+        ),
+    ]
+
 urlpatterns += [
      path('catalog/', include('catalog.urls')),
      path('', RedirectView.as_view(url='/catalog/', permanent=True)),
+     # Вход из django.contrib.auth.urls заменён на вариант с контролем нагрузки
+     path('accounts/login/', admission_control('password')(auth_views.LoginView.as_view()), name='login'),
      path('accounts/', include('django.contrib.auth.urls')),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
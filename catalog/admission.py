@@ -0,0 +1,174 @@
+import logging
+import math
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.connection import ConnectionProxy
+
+logger = logging.getLogger(__name__)
+
+# Состояние лимитов живёт в отдельном кеше, общем для всех воркеров
+CACHE_ALIAS = 'admission'
+cache = ConnectionProxy(caches, CACHE_ALIAS)
+
+REJECTION_REASONS = ('throttled', 'overloaded')
+
+# Сколько секунд живёт занятый слот одновременного запроса. Должно быть
+# больше самого долгого запроса: по истечении слот считается свободным.
+SLOT_TIMEOUT = 60
+
+
+def admission_control(endpoint_class):
+    """
+    Помечает view как дорогую точку входа класса ``endpoint_class``.
+
+    Сами ограничения применяет AdmissionControlMiddleware: для POST-запросов
+    она проверяет их до того, как CsrfViewMiddleware начнёт читать тело.
+    """
+    def decorator(view_func):
+        view_func.admission_class = endpoint_class
+        return view_func
+    return decorator
+
+
+def client_id(request):
+    """Пользователь для авторизованных запросов, иначе IP-адрес."""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return 'user:%s' % user.pk
+    return 'ip:%s' % request.META.get('REMOTE_ADDR', '')
+
+
+def count_request(endpoint_class, client, rate):
+    """
+    Учитывает запрос клиента; возвращает 0 или сколько секунд ждать.
+
+    Лимит считается в фиксированных окнах по ``period`` секунд: у каждого
+    окна свой счётчик в кеше CACHE_ALIAS, который увеличивается атомарным
+    cache.incr(). Поэтому параллельные запросы одного клиента из разных
+    воркеров не могут вместе превысить лимит.
+    """
+    limit, period = rate
+    now = time.time()
+    window = int(now // period)
+    key = 'catalog:admission:window:%s:%s:%d' % (endpoint_class, client, window)
+    cache.add(key, 0, timeout=period)
+    try:
+        count = cache.incr(key)
+    except ValueError:
+        # Ключ вытеснили между add() и incr()
+        cache.set(key, 1, timeout=period)
+        count = 1
+    if count > limit:
+        return (window + 1) * period - now
+    return 0
+
+
+def acquire_slot(endpoint_class, limit):
+    """
+    Занимает один из ``limit`` одновременных слотов класса.
+
+    Каждый слот — отдельный ключ кеша со своим временем жизни, занимается
+    атомарным cache.add(). Возвращает (ключ, метка владельца) или None,
+    если все слоты заняты. Слот, который не освободили (воркер убит посреди
+    запроса), сам освобождается через SLOT_TIMEOUT секунд.
+    """
+    owner = uuid.uuid4().hex
+    for index in range(limit):
+        key = slot_key(endpoint_class, index)
+        if cache.add(key, owner, timeout=SLOT_TIMEOUT):
+            return key, owner
+    return None
+
+
+def release_slot(slot):
+    """Освобождает слот, если он ещё не истёк и не достался другому запросу."""
+    key, owner = slot
+    if cache.get(key) == owner:
+        cache.delete(key)
+
+
+def slot_key(endpoint_class, index):
+    return 'catalog:admission:slot:%s:%d' % (endpoint_class, index)
+
+
+def rejection_key(endpoint_class, reason):
+    return 'catalog:admission:rejected:%s:%s' % (endpoint_class, reason)
+
+
+def record_rejection(request, endpoint_class, reason):
+    key = rejection_key(endpoint_class, reason)
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+    logger.warning(
+        'Admission control rejected %s %s (%s, %s)',
+        request.method, request.path, endpoint_class, reason,
+    )
+
+
+def rejection_stats():
+    """Число отклонённых запросов по классам точек входа и причинам."""
+    keys = {
+        rejection_key(endpoint_class, reason): (endpoint_class, reason)
+        for endpoint_class in settings.ADMISSION_CONTROL
+        for reason in REJECTION_REASONS
+    }
+    values = cache.get_many(keys)
+    stats = {
+        endpoint_class: dict.fromkeys(REJECTION_REASONS, 0)
+        for endpoint_class in settings.ADMISSION_CONTROL
+    }
+    for key, count in values.items():
+        endpoint_class, reason = keys[key]
+        stats[endpoint_class][reason] = count
+    return stats
+
+
+class AdmissionControlMiddleware:
+    """
+    Ограничивает дорогие POST-запросы, помеченные admission_control().
+
+    Каждый клиент может сделать не больше ``rate`` запросов к классу точек
+    входа за окно (429 при превышении), а на весь класс действует общий лимит одновременных
+    запросов (503 сразу, без ожидания). Должна стоять в MIDDLEWARE до
+    CsrfViewMiddleware, чтобы отклонять запрос до чтения тела.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            return self.get_response(request)
+        finally:
+            slot = getattr(request, '_admission_slot', None)
+            if slot:
+                release_slot(slot)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        endpoint_class = getattr(view_func, 'admission_class', None)
+        if endpoint_class is None or request.method != 'POST':
+            return None
+        config = settings.ADMISSION_CONTROL[endpoint_class]
+
+        retry_after = count_request(endpoint_class, client_id(request), config['rate'])
+        if retry_after:
+            record_rejection(request, endpoint_class, 'throttled')
+            response = HttpResponse('Слишком много запросов. Повторите попытку позже.', status=429)
+            response['Retry-After'] = str(math.ceil(retry_after))
+            return response
+
+        slot = acquire_slot(endpoint_class, config['concurrency'])
+        if slot is None:
+            record_rejection(request, endpoint_class, 'overloaded')
+            response = HttpResponse('Сервер перегружен. Повторите попытку позже.', status=503)
+            response['Retry-After'] = '1'
+            return response
+
+        request._admission_slot = slot
+        return None
@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+from .cache import is_shared_cache
+
+
+def user_cache_key(user_id):
+    return 'catalog:auth-user:%s' % user_id
+
+
+def invalidate_cached_user(user_id):
+    """Убирает пользователя из кеша (вызывается при сохранении и выходе)."""
+    cache.delete(user_cache_key(user_id))
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend, который держит пользователя вместе с UserProfile в кеше.
+
+    AuthenticationMiddleware вызывает get_user() на каждом запросе; с кешем
+    это не стоит ни одного запроса к auth_user. Запись живёт
+    AUTH_USER_CACHE_TIMEOUT секунд и сбрасывается сигналами из
+    catalog.signals при сохранении пользователя или профиля и при выходе.
+
+    Сигналы сбрасывают запись только в доступном им кеше, поэтому с кешем
+    в памяти процесса пользователь не кешируется вовсе.
+    """
+
+    def get_user(self, user_id):
+        if not is_shared_cache():
+            return super().get_user(user_id)
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            UserModel = get_user_model()
+            try:
+                user = UserModel._default_manager.select_related('userprofile').get(pk=user_id)
+            except UserModel.DoesNotExist:
+                return None
+            cache.set(key, user, settings.AUTH_USER_CACHE_TIMEOUT)
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,12 @@
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+
+# Бэкенды, чьё содержимое не видно другим процессам
+PROCESS_LOCAL_BACKENDS = (LocMemCache, DummyCache)
+
+
+def is_shared_cache(alias='default'):
+    """Видят ли все воркеры одно и то же содержимое кеша ``alias``."""
+    return not isinstance(caches[alias], PROCESS_LOCAL_BACKENDS)
@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+
+from . import admission
+from .cache import is_shared_cache
+
+
+@register(Tags.caches)
+def check_session_cache(app_configs, **kwargs):
+    """catalog.sessions нельзя использовать с кешем в памяти процесса."""
+    if settings.SESSION_ENGINE != 'catalog.sessions':
+        return []
+    if is_shared_cache(settings.SESSION_CACHE_ALIAS):
+        return []
+    return [
+        Error(
+            "SESSION_ENGINE 'catalog.sessions' требует общего для всех "
+            "воркеров кеша '%s'." % settings.SESSION_CACHE_ALIAS,
+            hint='Задайте DJANGO_CACHE_URL или используйте '
+                 "'django.contrib.sessions.backends.db'.",
+            id='catalog.E001',
+        )
+    ]
+
+
+@register(Tags.caches)
+def check_admission_cache(app_configs, **kwargs):
+    """Лимиты контроля нагрузки работают только в общем кеше."""
+    if admission.CACHE_ALIAS not in settings.CACHES:
+        return [
+            Error(
+                "Не настроен кеш '%s' для контроля нагрузки." % admission.CACHE_ALIAS,
+                id='catalog.E002',
+            )
+        ]
+    if is_shared_cache(admission.CACHE_ALIAS):
+        return []
+    return [
+        Warning(
+            "Кеш '%s' для контроля нагрузки живёт в памяти процесса: лимит "
+            "одновременных запросов и частоты запросов считаются отдельно в "
+            "каждом воркере." % admission.CACHE_ALIAS,
+            hint='Задайте DJANGO_CACHE_URL.',
+            id='catalog.W001',
+        )
+    ]
@@ -3,6 +3,7 @@ from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 import re
 from .models import Application
+from .uploads import validate_image_upload
 
 
 class RegisterForm(forms.Form):
@@ -44,6 +45,23 @@ class RegisterForm(forms.Form):
         return cleaned_data
 
 
+class ImageUploadField(forms.ImageField):
+    """
+    Поле изображения, которое проверяет только заголовок файла.
+
+    Вместо полной проверки через Pillow используется validate_image_upload,
+    а ошибки, найденные ImageUploadHandler во время загрузки, выводятся как
+    ошибки поля.
+    """
+    default_validators = [*forms.ImageField.default_validators, validate_image_upload]
+
+    def to_python(self, data):
+        error = getattr(data, 'upload_error', None)
+        if error:
+            raise ValidationError(error, code='invalid_image')
+        return forms.FileField.to_python(self, data)
+
+
 class ApplicationForm(forms.ModelForm):
     class Meta:
         model = Application
@@ -60,13 +78,9 @@ class ApplicationForm(forms.ModelForm):
             'category': 'Выберите подходящую категорию',
             'image': 'Загрузите фото или план помещения',
         }
-
-    def clean_image(self):
-        image = self.cleaned_data.get('image', False)
-        if image:
-            if image.size > 2 * 1024 * 1024:
-                raise forms.ValidationError("Размер изображения не должен превышать 2MB")
-        return image
+        field_classes = {
+            'image': ImageUploadField,
+        }
 
 
 class ApplicationStatusForm(forms.ModelForm):
@@ -83,6 +97,9 @@ class ApplicationStatusForm(forms.ModelForm):
             'design_image': 'Загрузите изображение готового дизайна',
             'admin_comment': 'Укажите комментарий при принятии заявки в работу',
         }
+        field_classes = {
+            'design_image': ImageUploadField,
+        }
 
     def clean(self):
         cleaned_data = super().clean()
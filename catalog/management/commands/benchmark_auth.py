@@ -0,0 +1,98 @@
+import tempfile
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from catalog.models import UserProfile
+
+
+AUTH_TABLES = ('django_session', 'auth_user')
+
+CONFIGURATIONS = [
+    ('db sessions + ModelBackend', {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+        'AUTHENTICATION_BACKENDS': ['django.contrib.auth.backends.ModelBackend'],
+    }),
+    ('project settings', {}),
+]
+
+# Для сравнения кеширующих сессий нужен общий между процессами кеш; если
+# DJANGO_CACHE_URL не задан, берём файловый во временном каталоге
+def file_cache_configuration(cache_dir):
+    return ('catalog.sessions + CachedModelBackend (file cache)', {
+        'SESSION_ENGINE': 'catalog.sessions',
+        'AUTHENTICATION_BACKENDS': ['catalog.backends.CachedModelBackend'],
+        'CACHES': {
+            'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': cache_dir,
+            },
+        },
+    })
+
+
+class Command(BaseCommand):
+    help = (
+        'Измеряет пропускную способность страницы для авторизованного '
+        'пользователя и число запросов к сессиям и auth_user на запрос.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Число GET-запросов на конфигурацию')
+        parser.add_argument('--url', default=None, help='Адрес страницы (по умолчанию профиль)')
+
+    def handle(self, *args, **options):
+        url = options['url'] or reverse('profile')
+        runner = DiscoverRunner(verbosity=0)
+        runner.setup_test_environment()
+        # Таблицы тестовой БД создаются прямо по моделям, без миграций
+        with override_settings(MIGRATION_MODULES={'catalog': None}):
+            old_config = runner.setup_databases()
+        try:
+            user = User.objects.create_user(username='benchmark', password='benchmark')
+            UserProfile.objects.create(user=user)
+            with tempfile.TemporaryDirectory() as cache_dir:
+                configurations = list(CONFIGURATIONS)
+                if not settings.CACHE_URL:
+                    configurations.append(file_cache_configuration(cache_dir))
+                for name, overrides in configurations:
+                    with override_settings(**overrides):
+                        self.run_configuration(name, url, user, options['requests'])
+        finally:
+            runner.teardown_databases(old_config)
+            runner.teardown_test_environment()
+
+    def run_configuration(self, name, url, user, requests):
+        client = Client()
+        client.force_login(user)
+        # Прогрев: первый запрос заполняет кеши
+        client.get(url)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        # Журнал запросов очищается на каждом новом запросе — сохраняем копию
+        queries = list(queries)
+        auth_queries = [q for q in queries if any(table in q['sql'] for table in AUTH_TABLES)]
+
+        start = time.perf_counter()
+        for _ in range(requests):
+            client.get(url)
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(
+            '%s: HTTP %d, %.1f req/s, %.2f ms/req, auth queries per request: %d (total %d)' % (
+                name,
+                response.status_code,
+                requests / elapsed,
+                elapsed / requests * 1000,
+                len(auth_queries),
+                len(queries),
+            )
+        )
@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+
+
+class SessionStore(CachedDBStore):
+    """
+    Сессии в кеше с записью в БД, без лишних записей.
+
+    Сессия читается из кеша, а в БД пишется, только если её данные
+    действительно изменились с момента загрузки. cycle_key() при входе
+    не создаёт промежуточную строку: новый ключ выдаётся при сохранении
+    в конце запроса, поэтому вход стоит одну вставку вместо двух записей.
+    """
+
+    def load(self):
+        data = super().load()
+        self._loaded_data = self._dump(data)
+        return data
+
+    def save(self, must_create=False):
+        if (
+            not must_create
+            and self.session_key is not None
+            and not settings.SESSION_SAVE_EVERY_REQUEST
+            and self._dump(self._get_session()) == getattr(self, '_loaded_data', None)
+        ):
+            return
+        super().save(must_create=must_create)
+        self._loaded_data = self._dump(self._get_session())
+
+    def cycle_key(self):
+        data = self._session
+        key = self.session_key
+        self._session_key = None
+        self._session_cache = data
+        self.modified = True
+        if key:
+            self.delete(key)
+
+    def _dump(self, data):
+        return self.serializer().dumps(data)
@@ -0,0 +1,87 @@
+from functools import partial
+
+from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_logged_out
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .backends import invalidate_cached_user
+from .models import Application, Category, UserProfile
+
+
+# Поля с изображениями, ссылки на которые нужно освобождать
+IMAGE_FIELDS = {
+    Application: ('image', 'design_image'),
+    Category: ('image',),
+}
+
+
+def release_image(field_file, name):
+    """Освобождает ссылку на файл после фиксации транзакции."""
+    storage = field_file.storage
+    transaction.on_commit(partial(storage.delete, name))
+
+
+@receiver(pre_save, sender=Application)
+@receiver(pre_save, sender=Category)
+def remember_replaced_images(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    Запоминает изображения, которые заменили или очистили.
+
+    Освобождать их здесь рано: новый файл ещё не сохранён, UPDATE не
+    выполнен, и при ошибке запись осталась бы ссылаться на удалённый блоб.
+    """
+    instance._replaced_images = []
+    if raw or instance.pk is None:
+        return
+    fields = [
+        name for name in IMAGE_FIELDS[sender]
+        if update_fields is None or name in update_fields
+    ]
+    if not fields:
+        return
+    stored = sender._default_manager.filter(pk=instance.pk).values(*fields).first()
+    if stored is None:
+        return
+    for name in fields:
+        field_file = getattr(instance, name)
+        if stored[name] and stored[name] != field_file.name:
+            instance._replaced_images.append((field_file, stored[name]))
+
+
+@receiver(post_save, sender=Application)
+@receiver(post_save, sender=Category)
+def release_replaced_images(sender, instance, **kwargs):
+    """Освобождает заменённые изображения после успешного сохранения."""
+    for field_file, name in getattr(instance, '_replaced_images', ()):
+        release_image(field_file, name)
+    instance._replaced_images = []
+
+
+@receiver(post_delete, sender=Application)
+@receiver(post_delete, sender=Category)
+def release_deleted_images(sender, instance, **kwargs):
+    """Освобождает ссылки на изображения удалённой заявки или категории."""
+    for name in IMAGE_FIELDS[sender]:
+        field_file = getattr(instance, name)
+        if field_file:
+            release_image(field_file, field_file.name)
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_user_cache(sender, instance, **kwargs):
+    """Сбрасывает закешированного пользователя после изменения."""
+    invalidate_cached_user(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=UserProfile)
+def invalidate_profile_cache(sender, instance, **kwargs):
+    """Профиль кешируется вместе с пользователем — сбрасываем и его."""
+    invalidate_cached_user(instance.user_id)
+
+
+@receiver(user_logged_out)
+def invalidate_user_cache_on_logout(sender, request, user, **kwargs):
+    if user is not None:
+        invalidate_cached_user(user.pk)
@@ -0,0 +1,135 @@
+import hashlib
+import os
+from contextlib import contextmanager
+
+from django.core.files import locks
+from django.core.files.storage import FileSystemStorage
+from django.utils._os import safe_makedirs
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible(path='catalog.storage.ContentAddressedStorage')
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Файловое хранилище с адресацией по содержимому.
+
+    Загруженный файл хешируется и сохраняется один раз под
+    именем ``<prefix>/ab/cd/<digest><ext>``. Повторная загрузка того же
+    содержимого ничего не пишет на диск, а лишь увеличивает счётчик ссылок
+    в файле ``<digest><ext>.refs`` рядом с блобом. ``delete()`` уменьшает
+    счётчик и удаляет блоб, когда ссылок не осталось.
+
+    Содержимое по такому URL никогда не меняется, поэтому его можно
+    кешировать навсегда.
+
+    Если хеш уже посчитан при приёме загрузки (атрибут ``digests``, его
+    заполняет catalog.uploads.ImageUploadHandler), файл не перечитывается.
+    """
+    hash_algorithm = 'sha256'
+    shard_depth = 2
+    shard_width = 2
+    refs_suffix = '.refs'
+    max_ext_length = 10
+
+    def __init__(self, prefix='blobs', **kwargs):
+        super().__init__(**kwargs)
+        self.prefix = prefix
+
+    def blob_name(self, digest, ext=''):
+        """Возвращает шардированное имя блоба для заданного хеша."""
+        shards = [
+            digest[i * self.shard_width:(i + 1) * self.shard_width]
+            for i in range(self.shard_depth)
+        ]
+        return '/'.join([self.prefix, *shards, digest + ext])
+
+    def get_available_name(self, name, max_length=None):
+        # Имя загрузки используется только ради расширения: итоговое имя
+        # определяется содержимым в _save(), поэтому искать свободное не нужно.
+        return str(name).replace('\\', '/')
+
+    def _save(self, name, content):
+        digest = getattr(content, 'digests', {}).get(self.hash_algorithm)
+        if digest is None:
+            digest = self._digest(content)
+        ext = os.path.splitext(name)[1].lower()[:self.max_ext_length]
+        name = self.blob_name(digest, ext)
+        full_path = self.path(name)
+        self._makedirs(os.path.dirname(full_path))
+
+        with self._locked_refs(name) as refs:
+            if not os.path.exists(full_path):
+                content.seek(0)
+                super()._save(name, content)
+            self._write_refs(refs, self._read_refs(refs) + 1)
+        return name
+
+    def delete(self, name):
+        if not name:
+            raise ValueError('The name must be given to delete().')
+        if not os.path.exists(self._refs_path(name)):
+            # Файл сохранён до перехода на это хранилище либо уже удалён.
+            return super().delete(name)
+
+        with self._locked_refs(name) as refs:
+            count = self._read_refs(refs) - 1
+            if count > 0:
+                self._write_refs(refs, count)
+                return
+            super().delete(name)
+            os.remove(self._refs_path(name))
+
+    def _digest(self, content):
+        """Считает хеш содержимого, читая его по частям."""
+        hasher = hashlib.new(self.hash_algorithm)
+        content.seek(0)
+        for chunk in content.chunks():
+            hasher.update(chunk if isinstance(chunk, bytes) else chunk.encode())
+        return hasher.hexdigest()
+
+    def _makedirs(self, directory):
+        if self.directory_permissions_mode is not None:
+            safe_makedirs(directory, self.directory_permissions_mode, exist_ok=True)
+        else:
+            os.makedirs(directory, exist_ok=True)
+
+    def _refs_path(self, name):
+        return self.path(name) + self.refs_suffix
+
+    @contextmanager
+    def _locked_refs(self, name):
+        """
+        Открывает файл счётчика ссылок под эксклюзивной блокировкой.
+
+        Если пока мы ждали блокировку, файл удалили (счётчик дошёл до нуля),
+        открываем его заново, чтобы не потерять ссылку.
+        """
+        path = self._refs_path(name)
+        while True:
+            refs = os.fdopen(os.open(path, os.O_RDWR | os.O_CREAT, 0o666), 'r+')
+            locks.lock(refs, locks.LOCK_EX)
+            try:
+                if os.path.samestat(os.fstat(refs.fileno()), os.stat(path)):
+                    break
+            except FileNotFoundError:
+                pass
+            locks.unlock(refs)
+            refs.close()
+        try:
+            yield refs
+        finally:
+            locks.unlock(refs)
+            refs.close()
+
+    @staticmethod
+    def _read_refs(refs):
+        refs.seek(0)
+        data = refs.read().strip()
+        return int(data) if data else 0
+
+    @staticmethod
+    def _write_refs(refs, count):
+        refs.seek(0)
+        refs.truncate()
+        refs.write(str(count))
+        refs.flush()
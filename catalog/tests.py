@@ -0,0 +1,510 @@
+import hashlib
+import os
+import shutil
+import struct
+import tempfile
+import time
+import uuid
+from unittest import mock
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import RequestDataTooBig
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, connection
+from django.test.utils import CaptureQueriesContext
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings,
+)
+from django.urls import reverse
+
+from . import admission
+from .backends import CachedModelBackend, user_cache_key
+from .forms import ApplicationForm
+from .models import Category, UserProfile
+from .sessions import SessionStore
+from .storage import ContentAddressedStorage
+from .uploads import ImageInfo, ImageUploadHandler, IncompleteHeader, parse_image_header
+
+
+def setUpModule():
+    # Миграции catalog в репозитории отсутствуют, поэтому таблицы тестовой
+    # БД создаются прямо по моделям
+    existing = connection.introspection.table_names()
+    with connection.schema_editor() as editor:
+        for model in apps.get_app_config('catalog').get_models():
+            if model._meta.db_table not in existing:
+                editor.create_model(model)
+
+
+def png_bytes(width=30, height=20, body=b''):
+    return (
+        b'\x89PNG\r\n\x1a\n' + struct.pack('>I', 13) + b'IHDR'
+        + struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0) + b'\x00' * 4 + body
+    )
+
+
+def bmp_bytes(width=30, height=20):
+    return b'BM' + b'\x00' * 12 + struct.pack('<Iii', 40, width, height) + b'\x00' * 28
+
+
+def os2_bmp_bytes(width=30, height=20):
+    return b'BM' + b'\x00' * 12 + struct.pack('<IHH', 12, width, height) + b'\x00' * 4
+
+
+def jpeg_segment(marker, payload):
+    return b'\xff' + bytes([marker]) + struct.pack('>H', len(payload) + 2) + payload
+
+
+def jpeg_bytes(width=30, height=20, exif=b''):
+    data = b'\xff\xd8'
+    if exif:
+        data += jpeg_segment(0xE1, b'Exif\x00\x00' + exif)
+    data += jpeg_segment(0xC0, struct.pack('>BHHB', 8, height, width, 3) + b'\x00' * 9)
+    return data + b'\xff\xda'
+
+
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.storage = ContentAddressedStorage()
+
+    def read_refs(self, name):
+        with open(self.storage.path(name) + '.refs') as refs:
+            return int(refs.read())
+
+    def blob_files(self):
+        return sorted(
+            name
+            for _, _, files in os.walk(self.media_root)
+            for name in files
+        )
+
+    def test_name_is_sharded_digest(self):
+        name = self.storage.save('applications/room.JPG', ContentFile(b'room'))
+        digest = os.path.splitext(os.path.basename(name))[0]
+        self.assertEqual(name, 'blobs/%s/%s/%s.jpg' % (digest[:2], digest[2:4], digest))
+        with self.storage.open(name) as blob:
+            self.assertEqual(blob.read(), b'room')
+
+    def test_duplicate_save_reuses_blob(self):
+        first = self.storage.save('applications/a.jpg', ContentFile(b'same'))
+        second = self.storage.save('designs/b.jpg', ContentFile(b'same'))
+        self.assertEqual(first, second)
+        self.assertEqual(self.read_refs(first), 2)
+        self.assertEqual(len(self.blob_files()), 2)  # блоб и .refs
+
+    def test_precomputed_digest_is_used(self):
+        content = ContentFile(b'data')
+        content.digests = {'sha256': 'ab' * 32}
+        name = self.storage.save('a.png', content)
+        self.assertEqual(name, 'blobs/ab/ab/%s.png' % ('ab' * 32))
+
+    def test_delete_decrements_refs(self):
+        name = self.storage.save('a.jpg', ContentFile(b'same'))
+        self.storage.save('b.jpg', ContentFile(b'same'))
+        self.storage.delete(name)
+        self.assertTrue(self.storage.exists(name))
+        self.assertEqual(self.read_refs(name), 1)
+
+    def test_last_delete_removes_blob_and_refs(self):
+        name = self.storage.save('a.jpg', ContentFile(b'same'))
+        self.storage.save('b.jpg', ContentFile(b'same'))
+        self.storage.delete(name)
+        self.storage.delete(name)
+        self.assertFalse(self.storage.exists(name))
+        self.assertFalse(os.path.exists(self.storage.path(name) + '.refs'))
+        self.assertEqual(self.blob_files(), [])
+
+    def test_replacing_image_releases_old_blob(self):
+        category = Category.objects.create(name='Кухни')
+        category.image.save('old.jpg', ContentFile(b'old'))
+        old_name = category.image.name
+        # Второй владелец того же блоба
+        self.storage.save('other.jpg', ContentFile(b'old'))
+        self.assertEqual(self.read_refs(old_name), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            category.image.save('new.jpg', ContentFile(b'new'))
+        self.assertEqual(self.read_refs(old_name), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            category.image = None
+            category.save()
+        self.assertEqual(self.read_refs(old_name), 1)
+
+    def test_delete_file_without_refs(self):
+        self.storage._makedirs(self.storage.path('applications'))
+        with open(self.storage.path('applications/old.jpg'), 'wb') as legacy:
+            legacy.write(b'old')
+        self.storage.delete('applications/old.jpg')
+        self.assertFalse(self.storage.exists('applications/old.jpg'))
+
+
+class ReplacedImageRollbackTests(TransactionTestCase):
+    """Без транзакции on_commit срабатывает сразу — как в обычном запросе."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_failed_save_keeps_old_blob(self):
+        category = Category.objects.create(name='Кухни')
+        category.image.save('old.jpg', ContentFile(b'old'))
+        old_path = category.image.path
+
+        category.image.save('new.jpg', ContentFile(b'new'), save=False)
+        category.name = None  # нарушает NOT NULL, UPDATE упадёт
+        with self.assertRaises(IntegrityError):
+            category.save()
+
+        with open(old_path + '.refs') as refs:
+            self.assertEqual(refs.read(), '1')
+
+
+class ParseImageHeaderTests(SimpleTestCase):
+    def test_png(self):
+        self.assertEqual(parse_image_header(png_bytes(640, 480)), ImageInfo('PNG', 640, 480))
+
+    def test_bmp(self):
+        self.assertEqual(parse_image_header(bmp_bytes(640, 480)), ImageInfo('BMP', 640, 480))
+
+    def test_bottom_up_bmp_has_positive_height(self):
+        self.assertEqual(parse_image_header(bmp_bytes(640, -480)), ImageInfo('BMP', 640, 480))
+
+    def test_os2_bmp(self):
+        self.assertEqual(parse_image_header(os2_bmp_bytes(640, 480)), ImageInfo('BMP', 640, 480))
+
+    def test_jpeg(self):
+        self.assertEqual(parse_image_header(jpeg_bytes(640, 480)), ImageInfo('JPEG', 640, 480))
+
+    def test_jpeg_skips_sof_bytes_inside_exif(self):
+        # Внутри EXIF лежат байты, похожие на маркер SOF с другими размерами
+        fake_sof = b'\xff\xc0\x00\x11\x08\x00\x01\x00\x01'
+        data = jpeg_bytes(640, 480, exif=fake_sof * 10)
+        self.assertEqual(parse_image_header(data), ImageInfo('JPEG', 640, 480))
+
+    def test_truncated_headers(self):
+        for data in (
+            png_bytes()[:20],
+            bmp_bytes()[:20],
+            jpeg_bytes()[:5],
+            jpeg_bytes(exif=b'\x00' * 100)[:50],
+            b'\x89P',
+        ):
+            with self.subTest(data=data):
+                with self.assertRaises(IncompleteHeader):
+                    parse_image_header(data)
+
+    def test_not_an_image(self):
+        for data in (b'GIF89a' + b'\x00' * 30, b'<html><body></body></html>'):
+            with self.subTest(data=data):
+                with self.assertRaises(ValueError) as cm:
+                    parse_image_header(data)
+                self.assertNotIsInstance(cm.exception, IncompleteHeader)
+
+
+@override_settings(IMAGE_UPLOAD_MAX_SIZE=2 * 1024 * 1024)
+class ImageUploadHandlerTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def upload(self, name, data):
+        request = RequestFactory().post('/catalog/application/create/', {
+            'title': 'Кухня',
+            'description': 'Новый дизайн кухни',
+            'image': SimpleUploadedFile(name, data, content_type='text/html'),
+        })
+        request.upload_handlers.insert(0, ImageUploadHandler(request))
+        return request
+
+    def image_errors(self, request):
+        form = ApplicationForm(request.POST, request.FILES)
+        form.is_valid()
+        return form.errors.get('image')
+
+    def test_valid_image_is_accepted(self):
+        data = png_bytes(body=b'\x00' * 1000)
+        request = self.upload('room.png', data)
+        image = request.FILES['image']
+        self.assertIsNone(self.image_errors(request))
+        self.assertEqual(image.image_info, ImageInfo('PNG', 30, 20))
+        self.assertEqual(image.content_type, 'image/png')
+        self.assertEqual(image.digests, {'sha256': hashlib.sha256(data).hexdigest()})
+        self.assertEqual(image.read(), data)
+
+    def test_content_type_comes_from_header(self):
+        request = RequestFactory().post('/catalog/application/create/', {
+            'title': 'Кухня',
+            'description': 'Новый дизайн кухни',
+            'image': SimpleUploadedFile('room.png', jpeg_bytes(), content_type='text/html'),
+        })
+        form = ApplicationForm(request.POST, request.FILES)
+        form.is_valid()
+        self.assertNotIn('image', form.errors)
+        self.assertEqual(form.cleaned_data['image'].content_type, 'image/jpeg')
+
+    def test_oversized_file_is_rejected(self):
+        request = self.upload('room.png', png_bytes(body=b'\x00' * (2 * 1024 * 1024)))
+        self.assertEqual(request.FILES['image'].size, 0)
+        self.assertEqual(self.image_errors(request), ['Размер изображения не должен превышать 2MB'])
+
+    def test_bad_magic_is_rejected(self):
+        request = self.upload('room.gif', b'GIF89a' + b'\x00' * 1000)
+        self.assertEqual(self.image_errors(request), ['Допустимы только изображения JPG, PNG или BMP'])
+
+    def test_too_large_dimensions_are_rejected(self):
+        request = self.upload('room.png', png_bytes(20000, 10))
+        self.assertEqual(
+            self.image_errors(request),
+            ['Ширина и высота изображения должны быть не больше 10000 пикселей'],
+        )
+
+    def test_body_over_limit_is_rejected_before_reading(self):
+        request = self.upload('room.png', png_bytes(body=b'\x00' * (3 * 1024 * 1024)))
+        with self.assertRaises(RequestDataTooBig):
+            request.POST
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class AdmissionControlTests(TestCase):
+    def setUp(self):
+        # У каждого теста свой пустой кеш для состояния лимитов
+        settings_override = override_settings(CACHES={
+            'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': 'default-%s' % uuid.uuid4().hex,
+            },
+            'admission': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': 'admission-%s' % uuid.uuid4().hex,
+            },
+        })
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def post_login(self):
+        return self.client.post(reverse('login'), {'username': 'nobody', 'password': 'wrong'})
+
+    def test_login_form_target_is_throttled(self):
+        with self.assertLogs('catalog.admission', 'WARNING'):
+            statuses = [self.post_login().status_code for _ in range(6)]
+        self.assertEqual(statuses, [200] * 5 + [429])
+
+    def test_throttled_response_has_retry_after(self):
+        for _ in range(5):
+            self.assertEqual(self.client.post(reverse('register'), {}).status_code, 200)
+        with self.assertLogs('catalog.admission', 'WARNING') as logs:
+            response = self.client.post(reverse('register'), {})
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(1 <= int(response['Retry-After']) <= 60)
+        self.assertIn('password, throttled', logs.output[0])
+
+    def test_clients_are_throttled_separately(self):
+        with self.assertLogs('catalog.admission', 'WARNING'):
+            for _ in range(6):
+                self.post_login()
+        response = self.client.post(
+            reverse('login'), {'username': 'nobody', 'password': 'wrong'}, REMOTE_ADDR='10.0.0.2',
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_get_is_not_limited(self):
+        for _ in range(10):
+            self.assertEqual(self.client.get(reverse('login')).status_code, 200)
+
+    def test_overloaded_when_all_slots_taken(self):
+        limit = settings.ADMISSION_CONTROL['password']['concurrency']
+        for _ in range(limit):
+            self.assertIsNotNone(admission.acquire_slot('password', limit))
+        with self.assertLogs('catalog.admission', 'WARNING'):
+            response = self.post_login()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+
+    def test_slot_is_released(self):
+        self.post_login()
+        limit = settings.ADMISSION_CONTROL['password']['concurrency']
+        slots = [admission.acquire_slot('password', limit) for _ in range(limit)]
+        self.assertNotIn(None, slots)
+
+    @override_settings(ADMISSION_CONTROL={'upload': {'rate': (10, 60), 'concurrency': 1}})
+    def test_slot_is_released_when_view_raises(self):
+        def view(request):
+            raise RuntimeError
+
+        def get_response(request):
+            self.assertIsNone(middleware.process_view(request, view, (), {}))
+            return view(request)
+
+        view.admission_class = 'upload'
+        middleware = admission.AdmissionControlMiddleware(get_response)
+        request = RequestFactory().post('/upload/')
+        with self.assertRaises(RuntimeError):
+            middleware(request)
+        self.assertIsNotNone(admission.acquire_slot('upload', 1))
+
+    def test_expired_slot_frees_itself(self):
+        limit = settings.ADMISSION_CONTROL['password']['concurrency']
+        for _ in range(limit):
+            admission.acquire_slot('password', limit)
+        self.assertIsNone(admission.acquire_slot('password', limit))
+        expired = time.time() + admission.SLOT_TIMEOUT + 1
+        with mock.patch('time.time', return_value=expired):
+            self.assertIsNotNone(admission.acquire_slot('password', limit))
+
+    def test_rejection_stats(self):
+        with self.assertLogs('catalog.admission', 'WARNING'):
+            for _ in range(7):
+                self.post_login()
+        stats = admission.rejection_stats()
+        self.assertEqual(stats['password'], {'throttled': 2, 'overloaded': 0})
+        self.assertEqual(stats['upload'], {'throttled': 0, 'overloaded': 0})
+
+    def test_admission_stats_is_staff_only(self):
+        url = reverse('admission-stats')
+        self.client.force_login(User.objects.create_user('client', password='secret'))
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        self.client.force_login(User.objects.create_user('staff', password='secret', is_staff=True))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), admission.rejection_stats())
+
+
+class CachedSessionAndUserTests(TestCase):
+    def setUp(self):
+        # catalog.sessions и кеш пользователей требуют общего кеша;
+        # файловый виден всем процессам
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        settings_override = override_settings(
+            SESSION_ENGINE='catalog.sessions',
+            AUTHENTICATION_BACKENDS=['catalog.backends.CachedModelBackend'],
+            PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+            CACHES={
+                'default': {
+                    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                    'LOCATION': cache_dir,
+                },
+                'admission': {
+                    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                    'LOCATION': 'admission-%s' % uuid.uuid4().hex,
+                },
+            },
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create_user('client', password='secret', first_name='Иван')
+        UserProfile.objects.create(user=self.user)
+
+    def auth_queries(self, queries):
+        return [
+            query['sql'] for query in queries
+            if 'django_session' in query['sql'] or 'auth_user' in query['sql']
+        ]
+
+    def test_authenticated_get_makes_no_auth_queries(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('profile'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('profile'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.auth_queries(queries), [])
+
+    def test_login_writes_session_once(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('login'), {'username': 'client', 'password': 'secret'})
+        self.assertEqual(response.status_code, 302)
+        writes = [
+            sql for sql in self.auth_queries(queries)
+            if 'django_session' in sql and not sql.startswith('SELECT')
+        ]
+        self.assertEqual(len(writes), 1)
+        self.assertTrue(writes[0].startswith('INSERT'))
+
+    def test_unchanged_session_is_not_written(self):
+        session = SessionStore()
+        session['theme'] = 'dark'
+        session.create()
+
+        session = SessionStore(session.session_key)
+        session['theme'] = 'dark'
+        with self.assertNumQueries(0):
+            session.save()
+
+        session['theme'] = 'light'
+        with CaptureQueriesContext(connection) as queries:
+            session.save()
+        self.assertTrue(any('django_session' in query['sql'] for query in queries))
+        self.assertEqual(SessionStore(session.session_key)['theme'], 'light')
+
+    def test_cycle_key_defers_new_key_to_save(self):
+        session = SessionStore()
+        session['theme'] = 'dark'
+        session.create()
+        old_key = session.session_key
+
+        session.cycle_key()
+        self.assertIsNone(session.session_key)
+        self.assertFalse(session.exists(old_key))
+        self.assertEqual(session['theme'], 'dark')
+
+        session.save()
+        self.assertNotEqual(session.session_key, old_key)
+        self.assertEqual(SessionStore(session.session_key)['theme'], 'dark')
+
+    def cached_user(self):
+        return cache.get(user_cache_key(self.user.pk))
+
+    def test_get_user_caches_user_with_profile(self):
+        backend = CachedModelBackend()
+        backend.get_user(self.user.pk)
+        with self.assertNumQueries(0):
+            user = backend.get_user(self.user.pk)
+            self.assertFalse(user.userprofile.is_employee)
+
+    def test_user_save_invalidates_cache(self):
+        backend = CachedModelBackend()
+        backend.get_user(self.user.pk)
+        self.user.first_name = 'Пётр'
+        self.user.save()
+        self.assertIsNone(self.cached_user())
+        self.assertEqual(backend.get_user(self.user.pk).first_name, 'Пётр')
+
+    def test_profile_save_invalidates_cache(self):
+        backend = CachedModelBackend()
+        backend.get_user(self.user.pk)
+        profile = self.user.userprofile
+        profile.is_employee = True
+        profile.save()
+        self.assertIsNone(self.cached_user())
+        self.assertTrue(backend.get_user(self.user.pk).userprofile.is_employee)
+
+    def test_logout_invalidates_cache(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('profile'))
+        self.assertIsNotNone(self.cached_user())
+        self.client.post(reverse('logout'))
+        self.assertIsNone(self.cached_user())
+
+    def test_process_local_cache_is_bypassed(self):
+        with override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        }):
+            CachedModelBackend().get_user(self.user.pk)
+            self.assertIsNone(self.cached_user())
@@ -1,12 +1,13 @@
 from django.urls import path
 from django.contrib.auth import views as auth_views
 from . import views
+from .admission import admission_control
 
 urlpatterns = [
     path('', views.index, name='index'),
     path('profile/', views.profile, name='profile'),
     path('register/', views.register, name='register'),
-    path('login/', auth_views.LoginView.as_view(), name='login'),
+    path('login/', admission_control('password')(auth_views.LoginView.as_view()), name='login'),
     path('logout/', auth_views.LogoutView.as_view(), name='logout'),
     path('applications/', views.ApplicationListView.as_view(), name='my-applications'),
     path('application/<int:pk>', views.ApplicationDetailView.as_view(), name='application-detail'),
@@ -16,6 +17,7 @@ urlpatterns = [
     # URL для администратора
     path('admin/applications/', views.all_applications_list, name='all-applications-list'),
     path('admin/application/<int:pk>/change/', views.change_application_status, name='change-application-status'),
+    path('admin/admission/', views.admission_stats, name='admission-stats'),
 
     # URL для управления категориями
     path('categories/create/', views.CategoryCreateView.as_view(), name='category-create'),
@@ -10,7 +10,9 @@ from django.views import generic
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic.edit import DeleteView, CreateView, UpdateView
 from django.urls import reverse_lazy
-from django.http import HttpResponseForbidden
+from django.http import HttpResponseForbidden, JsonResponse
+from .admission import admission_control, rejection_stats
+from .uploads import image_uploads
 
 
 def index(request):
@@ -32,6 +34,7 @@ def profile(request):
     return render(request, 'profile.html')
 
 
+@admission_control('password')
 def register(request):
     if request.method == 'POST':
         form = RegisterForm(request.POST)
@@ -59,6 +62,8 @@ def register(request):
     return render(request, 'registration/register.html', {'form': form})
 
 
+@admission_control('upload')
+@image_uploads
 @login_required
 def create_application(request):
     """View function for creating an application."""
@@ -142,6 +147,8 @@ def all_applications_list(request):
     return render(request, 'catalog/all_applications_list.html', {'application_list': applications})
 
 
+@admission_control('upload')
+@image_uploads
 @staff_member_required
 def change_application_status(request, pk):
     """Изменение статуса заявки администратором с проверками."""
@@ -168,6 +175,12 @@ def change_application_status(request, pk):
     })
 
 
+@staff_member_required
+def admission_stats(request):
+    """Число запросов, отклонённых контролем нагрузки."""
+    return JsonResponse(rejection_stats())
+
+
 # Классы для управления категориями
 class CategoryCreateView(LoginRequiredMixin, CreateView):
     model = Category